@@ -7,12 +7,47 @@
 
 import os                           ## for file path manipulations
 import sys                          ## for system specific parameters and functions    
+import time                         ## for throttling progress output
+import argparse                     ## for command line options
+
+#==Size the BLAS/OpenMP/numba thread pools from IDW_WORKERS, this only works before numpy is imported==
+###invalid values are left alone here and reported by parse_arguments###
+if os.environ.get("IDW_WORKERS", "").isdigit() and int(os.environ["IDW_WORKERS"]) > 0:
+    for thread_variable in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMBA_NUM_THREADS"):
+        os.environ.setdefault(thread_variable, os.environ["IDW_WORKERS"])
+
+from concurrent.futures import ProcessPoolExecutor  ## for interpolating tiles in parallel
+from concurrent.futures import ThreadPoolExecutor   ## for parallel KD-tree pair searches
+import multiprocessing                              ## for starting worker processes without fork
+from multiprocessing import shared_memory           ## for sharing point data with worker processes
 
 import numpy as np                  ## for numerical operations
 
 from osgeo import gdal              ## for raster data processing
 from osgeo import ogr               ## for vector data processing
 
+try:
+    from scipy.spatial import cKDTree   ## for nearest neighbour search (optional)
+except ImportError:
+    cKDTree = None
+
+try:
+    import numba                        ## for compiling the interpolation kernel (optional)
+    from numba import prange
+except ImportError:
+    numba = None
+    prange = range
+
+try:
+    import cupy                         ## for running the interpolation on a CUDA GPU (optional)
+except ImportError:
+    cupy = None
+
+try:
+    from idw_kernel_aot import idw_kernel as idw_kernel_aot    ## for the precompiled kernel (optional, see build_idw_kernel.py)
+except ImportError:
+    idw_kernel_aot = None
+
 # endregion #
 
 # region 2. File Directory Configurations #
@@ -62,6 +97,32 @@ def defence_check():
         return False
     return True
 
+def wkb_points_to_xy(wkb_geometries):
+    """
+    Function to decode point geometries from WKB in one go.
+    A WKB point is byte order (1 byte), geometry type (4 bytes), X (8 bytes), Y (8 bytes),
+    followed by Z and/or M (8 bytes each) for 3D and measured points, which are skipped.
+    
+    Parameters:
+    wkb_geometries (numpy.ndarray): Array of WKB encoded point geometries.
+    
+    Returns:
+    x, y (numpy.ndarray): X and Y coordinates of the points.
+    """
+    ##==1. Find where every geometry starts in the joined buffer, points may be 21, 29 or 37 bytes==##
+    lengths = np.fromiter(map(len, wkb_geometries), dtype=np.intp, count=len(wkb_geometries))
+    starts = np.cumsum(lengths) - lengths
+    raw = np.frombuffer(b"".join(wkb_geometries), dtype=np.uint8)
+
+    ##==2. Gather the 16 X/Y bytes behind each 5 byte header==##
+    coords = raw[starts[:, None] + np.arange(5, 21)]
+
+    ##==3. The first byte tells the byte order: 1 = little endian, 0 = big endian==##
+    little_endian = raw[starts] == 1
+    x = np.where(little_endian, coords[:, :8].view("<f8")[:, 0], coords[:, :8].view(">f8")[:, 0])
+    y = np.where(little_endian, coords[:, 8:].view("<f8")[:, 0], coords[:, 8:].view(">f8")[:, 0])
+    return x, y
+
 def shp_reader(shp_path, z_field="Z"):
     """
     Function to read a shapefile and extract point data.
@@ -71,7 +132,7 @@ def shp_reader(shp_path, z_field="Z"):
     z_field (str): Name of the field containing Z values. Gotten from the attribute table of the shapefile.
     
     Returns:
-    points (list): List of tuples containing (X, Y, Z) coordinates.
+    points (numpy.ndarray): Array of shape (N, 3) containing (X, Y, Z) coordinates.
     spatial_ref (osr.SpatialReference): Spatial reference of the shapefile.
 
     """
@@ -87,23 +148,54 @@ def shp_reader(shp_path, z_field="Z"):
     spatial_ref = layer.GetSpatialRef()
 
     #==3.Extract point data==
-    all_points = []
+    ###GDAL 3.6+ can hand over whole columns as numpy arrays, which avoids###
+    ###a Python round trip for every single feature###
+    ###Point, Point Z, Point M and Point ZM layers all share this path###
+    if hasattr(layer, "GetArrowStreamAsNumPy") and ogr.GT_Flatten(layer.GetGeomType()) == ogr.wkbPoint:
+        geometry_column = layer.GetGeometryColumn() or "wkb_geometry"
+        x_parts, y_parts, z_parts = [], [], []
+
+        for batch in layer.GetArrowStreamAsNumPy(options=["INCLUDE_FID=NO"]):
+            if z_field not in batch:    ###defence check for the Z field
+                print(f"Field {z_field} not found in {shp_path}.")
+                return None, None
+
+            ##==Keep only features with a geometry and a Z value==##
+            wkb = batch[geometry_column]
+            z = batch[z_field]
+            valid = np.not_equal(wkb, None) & ~np.ma.getmaskarray(z)
+
+            ##==Get X, Y, Z values==##
+            x, y = wkb_points_to_xy(wkb[valid])
+            x_parts.append(x)
+            y_parts.append(y)
+            z_parts.append(np.ma.getdata(z)[valid].astype(np.float64))
 
-    for p_feature in layer:
-        #==Get geometry and coordinates==
-        geom = p_feature.GetGeometryRef()
+        all_points = np.empty((0, 3))
+        if x_parts:
+            all_points = np.column_stack((np.concatenate(x_parts), np.concatenate(y_parts), np.concatenate(z_parts)))
 
-        #==Get X, Y, Z values==
-        x = geom.GetX()
-        y = geom.GetY()
-        z = p_feature.GetField(z_field)
+    else:
+        ##==Preallocate one row per feature instead of growing a list of tuples==##
+        all_points = np.empty((layer.GetFeatureCount(), 3), dtype=np.float64)
+        n_points = 0
 
-        #==Append the point to the list==
-        if z is not None:
-            all_points.append((x, y, z))
+        for p_feature in layer:
+            #==Get geometry and coordinates==
+            geom = p_feature.GetGeometryRef()
+
+            #==Get X, Y, Z values==
+            x = geom.GetX()
+            y = geom.GetY()
+            z = p_feature.GetField(z_field)
+
+            #==Store the point in the next free row==
+            if z is not None:
+                all_points[n_points] = (x, y, z)
+                n_points += 1
     
-    #==4.Convert to numpy array==
-    all_points = np.array(all_points)
+        #==4.Drop the rows left empty by features without a Z value==
+        all_points = all_points[:n_points]
 
     #==5.Issue feedback==
     print(f"System has successfully read {len(all_points)} points from {shp_path}.")
@@ -153,17 +245,438 @@ def raster_region_setup(all_points, cell_size):
 
     return extent
 
-def idw_interpolation(all_points,extent, power):
+def idw_weights(d2, power):
+    """
+    Function to turn squared distances into IDW weights without taking a square root.
+    w = 1 / d^p = (d²)^(-p/2)
+    Weights are computed in float64: for a point (almost) on a cell center float32 would
+    overflow to inf from power 6 and underflow (d²)^(p/2) to 0 from power 7.
+    
+    Parameters:
+    d2 (numpy.ndarray): Squared distances, already clamped above zero.
+    power (float): Power parameter for IDW interpolation.
+    
+    Returns:
+    weights (numpy.ndarray): float64 IDW weights.
+    """
+    d2 = d2.astype(np.float64)
+
+    ##==The default power 2 needs a single reciprocal, no pow call==##
+    if power == 2:
+        return 1.0 / d2
+    if power == 4:
+        return 1.0 / (d2 * d2)
+
+    ##==Other small integer powers are built from multiplications, odd ones need one extra sqrt==##
+    ## d^p = (d²)^(p//2) × d for odd p ##
+    if float(power).is_integer() and 0 < power <= 8:
+        denominator = d2 ** 0.5 if int(power) % 2 else 1.0
+        for _ in range(int(power) // 2):
+            denominator = denominator * d2
+        return 1.0 / denominator
+
+    return d2 ** (-0.5 * power)
+
+def idw_power_terms(power):
+    """
+    Function to split the power parameter into the terms the compiled kernel builds weights from.
+    
+    Parameters:
+    power (float): Power parameter for IDW interpolation.
+    
+    Returns:
+    exponent (float): -p/2, used with pow when the power is not a small integer.
+    half (int): p//2 for integer powers up to 8, -1 for any other power.
+    odd (bool): True for odd integer powers, which need one extra sqrt.
+    """
+    if power == np.floor(power) and 0 < power <= 8:
+        return -0.5 * power, int(power) // 2, int(power) % 2 == 1
+    return -0.5 * power, -1, False
+
+def idw_point_weight(d2, exponent, half, odd):
+    """
+    Function to calculate the IDW weight of a single point inside the compiled kernel.
+    Small integer powers are built from multiplications, any other power uses pow.
+    ## d^p = (d²)^(p//2) × d for odd p ##
+    
+    Parameters:
+    d2 (float): Squared distance, already clamped above zero.
+    exponent, half, odd: Power terms, see idw_power_terms.
+    
+    Returns:
+    weight (float): IDW weight.
+    """
+    if half < 0:
+        return d2 ** exponent
+
+    denominator = np.sqrt(d2) if odd else 1.0
+    for _ in range(half):
+        denominator = denominator * d2
+    return 1.0 / denominator
+
+def idw_kernel_factory(power=None):
+    """
+    Function to build the per-cell IDW loop, optionally specialized for one power value.
+    A specialized kernel holds the power terms as plain closure constants, which numba folds
+    into the compiled code (no pow call for integer powers) and keys its disk cache on.
+    
+    Parameters:
+    power (float): Power to specialize for. None builds a kernel that takes the power at run time.
+    
+    Returns:
+    idw_kernel (function): The IDW loop, see idw_kernel.
+    """
+    specialized = power is not None
+    fixed_exponent, fixed_half, fixed_odd = idw_power_terms(power) if specialized else (0.0, -1, False)
+
+    def idw_kernel(interpo_x, interpo_y, interpo_z, xs, ys, power):
+        """
+        Function holding the per-cell IDW loop. Compiled with numba when it is installed.
+        
+        Parameters:
+        interpo_x, interpo_y, interpo_z (numpy.ndarray): Point coordinates and values.
+        xs (numpy.ndarray): Center X coordinates of the raster columns.
+        ys (numpy.ndarray): Center Y coordinates of the raster rows.
+        power (float): Power parameter for IDW interpolation. Ignored by a specialized kernel.
+        
+        Returns:
+        raster (numpy.ndarray): 2D float32 array representing the interpolated raster.
+        """
+        rows = ys.shape[0]
+        cols = xs.shape[0]
+        raster = np.empty((rows, cols), dtype=np.float32)
+        n_points = interpo_x.shape[0]
+
+        ##==Power terms: constants for a specialized kernel, from the power argument otherwise==##
+        if specialized:
+            exponent, half, odd = fixed_exponent, fixed_half, fixed_odd
+        else:
+            exponent, half, odd = idw_power_terms(power)
+
+        ##==Distances stay in float32, weights and sums are float64 so exact hits can not overflow==##
+        min_d2 = np.float32(1e-12)
+
+        ##==Rows are independent, so they are spread over all cores==##
+        for r in prange(rows):
+            target_y = ys[r]
+            for c in range(cols):
+                target_x = xs[c]
+
+                upper_p = 0.0
+                lower_p = 0.0
+                for i in range(n_points):
+                    dx = interpo_x[i] - target_x
+                    dy = interpo_y[i] - target_y
+                    d2 = max(dx * dx + dy * dy, min_d2)
+                    weight = idw_point_weight(np.float64(d2), exponent, half, odd)
+
+                    upper_p += weight * interpo_z[i]
+                    lower_p += weight
+
+                raster[r, c] = upper_p / lower_p
+
+        return raster
+
+    return idw_kernel
+
+if numba is not None:
+    idw_power_terms = numba.njit(inline="always")(idw_power_terms)
+    idw_point_weight = numba.njit(inline="always")(idw_point_weight)
+
+###generic kernel taking the power at run time, used for the ahead-of-time build and without numba###
+idw_kernel = idw_kernel_factory()
+
+###compiled kernels specialized for one power value, keyed by power###
+IDW_KERNELS = {}
+
+def specialized_idw_kernel(power):
+    """
+    Function to get the numba compiled IDW kernel specialized for one power value.
+    Every power is compiled once and kept in IDW_KERNELS, numba also caches it on disk.
+    
+    Parameters:
+    power (float): Power parameter for IDW interpolation.
+    
+    Returns:
+    kernel (numba.core.registry.CPUDispatcher): Compiled kernel, see idw_kernel.
+    """
+    if power not in IDW_KERNELS:
+        IDW_KERNELS[power] = numba.njit(parallel=True, fastmath=True, cache=True)(
+            idw_kernel_factory(float(power))
+            )
+    return IDW_KERNELS[power]
+
+def idw_numpy_kernel(interpo_x, interpo_y, interpo_z, xs, ys, power, block_bytes=512 * 1024):
+    """
+    Function to perform IDW interpolation with NumPy, one raster row at a time.
+    Each row is split into blocks of cells that are evaluated against all points in a single broadcast.
+    The block width is chosen so the (cells, N) distance array stays in the CPU cache.
+    
+    Parameters:
+    interpo_x, interpo_y, interpo_z (numpy.ndarray): Point coordinates and values.
+    xs (numpy.ndarray): Center X coordinates of the raster columns.
+    ys (numpy.ndarray): Center Y coordinates of the raster rows.
+    power (float): Power parameter for IDW interpolation.
+    block_bytes (int): Size budget of one (cells, N) float64 weight array. Default is 512 KiB, half a typical L2 cache.
+    
+    Returns:
+    raster (numpy.ndarray): 2D float32 array representing the interpolated raster.
+    """
+    raster = np.empty((len(ys), len(xs)), dtype=np.float32)
+    block = max(1, block_bytes // (len(interpo_x) * 8))
+
+    ###weights @ [z, 1] gives Σ(w × z) and Σ(w) in one pass over the weights###
+    z_and_one = np.column_stack((interpo_z.astype(np.float64), np.ones(len(interpo_z))))
+
+    for c0 in range(0, len(xs), block):
+        c1 = min(c0 + block, len(xs))
+
+        ##==1. The X part of the distances is shared by every row of the block==##
+        dx2 = interpo_x - xs[c0:c1, None]
+        np.square(dx2, out=dx2)
+        d2 = np.empty_like(dx2)
+
+        for r in range(len(ys)):
+
+            ##==2. Calculate squared distances from all points to every cell center of the block==##
+            ## d² = (x2-x1)² + (y2-y1)², shape (cells, N) ##
+            np.add(dx2, (interpo_y - ys[r]) ** 2, out=d2)
+
+            ##==3. Avoid division by zero by setting a minimum distance threshold==##
+            np.maximum(d2, 1e-12, out=d2)
+
+            ##==4. Calculate weights based on distances and power parameter==##
+            weights = idw_weights(d2, power)
+
+            ##==5. Calculate the interpolated values for the block==##
+            ## z = Σ(w × z) / Σ(w) ##
+            upper_p, lower_p = (weights @ z_and_one).T
+            raster[r, c0:c1] = upper_p / lower_p
+
+    return raster
+
+def gpu_available():
+    """
+    Function to check whether cupy is installed and a CUDA device can be used.
+    
+    Returns:
+    available (bool): True when the cupy backend can run.
+    """
+    if cupy is None:
+        return False
+    try:
+        return cupy.cuda.runtime.getDeviceCount() > 0
+    except cupy.cuda.runtime.CUDARuntimeError:
+        return False
+
+def idw_cupy_kernel(interpo_x, interpo_y, interpo_z, xs, ys, power, block_bytes=256 * 1024 * 1024):
+    """
+    Function to perform IDW interpolation on a CUDA GPU with cupy.
+    Blocks of rows x columns are evaluated against all points in one 3D broadcast, sized so the
+    (rows, cols, N) arrays fit in GPU memory.
+    
+    Parameters:
+    interpo_x, interpo_y, interpo_z (cupy.ndarray): Point coordinates and values, already on the GPU.
+    xs (numpy.ndarray): Center X coordinates of the raster columns.
+    ys (numpy.ndarray): Center Y coordinates of the raster rows.
+    power (float): Power parameter for IDW interpolation.
+    block_bytes (int): Size budget of one (rows, cols, N) float64 weight array on the GPU. Default is 256 MiB.
+    
+    Returns:
+    raster (numpy.ndarray): 2D float32 array representing the interpolated raster.
+    """
+    ##==1. Upload the cell centers of the tile as a sparse grid: (1, cols) and (rows, 1)==##
+    ###broadcasting does the rest, the full (rows, cols) coordinate grids are never built###
+    grid_x, grid_y = cupy.meshgrid(cupy.asarray(xs), cupy.asarray(ys), indexing='xy', sparse=True, copy=False)
+
+    raster = cupy.empty((len(ys), len(xs)), dtype=cupy.float32)
+    n_points = len(interpo_x)
+    col_block = max(1, min(len(xs), block_bytes // (n_points * 8)))
+    row_block = max(1, block_bytes // (col_block * n_points * 8))
+
+    ###weights @ [z, 1] gives Σ(w × z) and Σ(w) in one pass over the weights###
+    z_and_one = cupy.stack((interpo_z.astype(cupy.float64), cupy.ones(len(interpo_z))), axis=1)
+
+    for c0 in range(0, len(xs), col_block):
+        c1 = min(c0 + col_block, len(xs))
+
+        ##==2. The X part of the distances is shared by every row, shape (1, cols, N)==##
+        dx2 = (interpo_x - grid_x[:, c0:c1, None]) ** 2
+
+        for r0 in range(0, len(ys), row_block):
+            r1 = min(r0 + row_block, len(ys))
+
+            ##==3. Broadcast the Y part over it, avoid division by zero and calculate weights==##
+            ## d² = (x2-x1)² + (y2-y1)², shape (rows, cols, N) ##
+            d2 = dx2 + (interpo_y - grid_y[r0:r1, :, None]) ** 2
+            cupy.maximum(d2, 1e-12, out=d2)
+            weights = idw_weights(d2, power)
+
+            ##==4. Calculate the interpolated values for the block==##
+            ## z = Σ(w × z) / Σ(w) ##
+            sums = weights @ z_and_one
+            raster[r0:r1, c0:c1] = sums[..., 0] / sums[..., 1]
+
+    ##==5. Download the tile back to the host==##
+    return cupy.asnumpy(raster)
+
+def generate_tiling_grid(rows, cols, tile=512):
+    """
+    Function to split the raster grid into square tiles.
+    
+    Parameters:
+    rows (int): Number of raster rows.
+    cols (int): Number of raster columns.
+    tile (int): Edge length of a tile in cells. Default is 512.
+    
+    Returns:
+    windows (list): List of (row_start, row_end, col_start, col_end) tuples covering the raster.
+    """
+    windows = []
+    for r0 in range(0, rows, tile):
+        for c0 in range(0, cols, tile):
+            windows.append((r0, min(r0 + tile, rows), c0, min(c0 + tile, cols)))
+    return windows
+
+def idw_tile_worker(shm_name, points_shape, xs, ys, power):
+    """
+    Function run inside a worker process to interpolate a single tile.
+    The point data is read from shared memory instead of being pickled for every tile.
+    
+    Parameters:
+    shm_name (str): Name of the shared memory block holding the point array.
+    points_shape (tuple): Shape of the point array.
+    xs (numpy.ndarray): Center X coordinates of the tile columns.
+    ys (numpy.ndarray): Center Y coordinates of the tile rows.
+    power (float): Power parameter for IDW interpolation.
+    
+    Returns:
+    tile (numpy.ndarray): 2D float32 array representing the interpolated tile.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    all_points = np.ndarray(points_shape, dtype=np.float32, buffer=shm.buf)
+
+    tile = idw_numpy_kernel(all_points[:, 0], all_points[:, 1], all_points[:, 2], xs, ys, power)
+
+    ###the array view has to be released before the shared memory can be closed###
+    del all_points
+    shm.close()
+    return tile
+
+def idw_knn_kernel(tree, interpo_z, xs, ys, power, k, workers=-1):
+    """
+    Function to perform IDW interpolation using only the k nearest points of every cell.
+    Distant points carry almost no weight, so a KD-tree query replaces the scan over all points.
+    
+    Parameters:
+    tree (scipy.spatial.cKDTree): KD-tree built over the point coordinates.
+    interpo_z (numpy.ndarray): Point values.
+    xs (numpy.ndarray): Center X coordinates of the raster columns.
+    ys (numpy.ndarray): Center Y coordinates of the raster rows.
+    power (float): Power parameter for IDW interpolation.
+    k (int): Number of nearest points used for each cell.
+    workers (int): Number of threads for the KD-tree query. Default is -1, all CPUs.
+    
+    Returns:
+    raster (numpy.ndarray): 2D float32 array representing the interpolated raster.
+    """
+    ##==1. Query the k nearest points of every cell center==##
+    targets = np.stack(np.meshgrid(xs, ys, indexing='xy'), axis=-1).reshape(-1, 2)
+    distances, indices = tree.query(targets, k=k, workers=workers)
+    distances = distances.reshape(len(targets), k)
+    indices = indices.reshape(len(targets), k)
+
+    ##==2. Avoid division by zero and calculate weights from squared distances==##
+    distances = distances.astype(np.float32)
+    d2 = np.square(distances, out=distances)
+    np.maximum(d2, 1e-12, out=d2)
+    weights = idw_weights(d2, power)
+
+    ##==3. Calculate the interpolated values==##
+    ## z = Σ(w × z) / Σ(w) ##
+    upper_p = np.einsum('ck,ck->c', weights, interpo_z[indices])
+    lower_p = weights.sum(axis=1)
+    return (upper_p / lower_p).reshape(len(ys), len(xs)).astype(np.float32)
+
+def idw_radius_kernel(tree, interpo_z, xs, ys, power, radius, workers=-1):
+    """
+    Function to perform IDW interpolation using only the points within a search radius of every cell.
+    Cells without any point inside the radius are set to the nodata value -9999.
+    
+    Parameters:
+    tree (scipy.spatial.cKDTree): KD-tree built over the point coordinates.
+    interpo_z (numpy.ndarray): Point values.
+    xs (numpy.ndarray): Center X coordinates of the raster columns.
+    ys (numpy.ndarray): Center Y coordinates of the raster rows.
+    power (float): Power parameter for IDW interpolation.
+    radius (float): Search radius around every cell center, in map units.
+    workers (int): Number of threads for the KD-tree search. Default is -1, all CPUs.
+    
+    Returns:
+    raster (numpy.ndarray): 2D float32 array representing the interpolated raster.
+    """
+    cols = len(xs)
+    threads = os.cpu_count() if workers < 1 else workers
+    row_blocks = np.array_split(np.arange(len(ys)), min(threads, len(ys)))
+
+    def pair_search(rows):
+        """
+        Function to find every (cell, point) pair within the search radius for a block of rows.
+        
+        Parameters:
+        rows (numpy.ndarray): Indices of the rows in the block.
+        
+        Returns:
+        pairs (numpy.ndarray): Structured array with the cell index 'i', point index 'j' and distance 'v'.
+        """
+        targets = np.stack(np.meshgrid(xs, ys[rows], indexing='xy'), axis=-1).reshape(-1, 2)
+        pairs = cKDTree(targets).sparse_distance_matrix(tree, radius, output_type='ndarray')
+        pairs['i'] += rows[0] * cols
+        return pairs
+
+    ##==1. Find the (cell, point) pairs and their distances with a dual tree search==##
+    ###the search runs in C without the GIL, so row blocks are searched on a thread pool###
+    with ThreadPoolExecutor(max_workers=len(row_blocks)) as executor:
+        pairs = np.concatenate(list(executor.map(pair_search, row_blocks)))
+    cells = pairs['i']
+
+    ##==2. Calculate weights from squared distances==##
+    d2 = pairs['v'] * pairs['v']
+    np.maximum(d2, 1e-12, out=d2)
+    weights = idw_weights(d2, power)
+
+    ##==3. Sum the weighted values of every cell==##
+    ## z = Σ(w × z) / Σ(w) ##
+    n_cells = len(ys) * cols
+    upper_p = np.bincount(cells, weights=weights * interpo_z[pairs['j']], minlength=n_cells)
+    lower_p = np.bincount(cells, weights=weights, minlength=n_cells)
+    has_points = np.bincount(cells, minlength=n_cells) > 0
+
+    raster = np.full(n_cells, -9999, dtype=np.float32)
+    raster[has_points] = upper_p[has_points] / lower_p[has_points]
+    return raster.reshape(len(ys), cols)
+
+def idw_interpolation(all_points,extent, power, k_neighbors=None, backend=None, tile_size=512, workers=None, out_band=None, search_radius=None):
     """
     Function to perform IDW interpolation on point data.
+    The raster is computed tile by tile. When an output band is given every tile is written
+    to it as soon as it is ready, so the whole raster never has to be held in memory.
     
     Parameters:
     all_points (numpy.ndarray): Array of point coordinates and values. Gotten from shp_reader function.
     extent (dict): Dictionary containing raster extents and cell size. Gotten from raster_region_setup function.
     power (int): Power parameter for IDW interpolation. Default is 2.
+    k_neighbors (int): Number of nearest points used for each cell. None uses all points. Requires scipy.
+    search_radius (float): Only points within this distance of a cell are used. None uses all points. Requires scipy.
+    backend (str): "numba", "numpy", "cupy" or "multiprocessing". None picks numba when it is installed.
+                   "multiprocessing" starts its workers without fork (forkserver, spawn on Windows), so a
+                   script calling it must do so under an if __name__ == "__main__": guard, as main() does.
+    tile_size (int): Edge length of the tiles the raster is processed in.
+    workers (int): Number of threads (numba, KD-tree queries) or processes (multiprocessing) to use. None uses all CPUs.
+    out_band (gdal.Band): Raster band to write tiles into. Gotten from raster_creator function.
     
     Returns:
-    raster (numpy.ndarray): 2D array representing the interpolated raster.
+    raster (numpy.ndarray): 2D array representing the interpolated raster. None when out_band is given.
     """
     #==1.Extract raster parameters from extent data==
     x_min = extent['all_x_min']
@@ -172,56 +685,160 @@ def idw_interpolation(all_points,extent, power):
     rows = extent['rows']
     cell_size = extent['cell_size']
 
-    #==2.Build an empty raster array for storing interpolated values==
-    initial_raster_data = np.zeros((rows, cols), dtype=np.float32)
+    #==2.Build an empty raster array for storing interpolated values, unless tiles go straight to disk==
+    initial_raster_data = None
+    if out_band is None:
+        initial_raster_data = np.zeros((rows, cols), dtype=np.float32)
 
     #==3.Extract all point coordinates and values for interpolation==
-    interpo_x = all_points[:, 0]
-    interpo_y = all_points[:, 1]
-    interpo_z = all_points[:, 2]
+    ###distances are computed in float32 to halve memory traffic, weights in float64. Coordinates are###
+    ###shifted to the upper left raster corner first so float32 still resolves them to about a millimetre###
+    interpo_x = np.ascontiguousarray(all_points[:, 0] - x_min, dtype=np.float32)
+    interpo_y = np.ascontiguousarray(all_points[:, 1] - y_max, dtype=np.float32)
+    interpo_z = np.ascontiguousarray(all_points[:, 2], dtype=np.float32)
 
-    #==4.Perform IDW interpolation==
-    for r in range(rows):
-        for c in range(cols):
-            
-            ##==4.1 Calculate the center coordinates of the current raster cell==##
-            target_x = x_min + c * cell_size + cell_size / 2
-            target_y = y_max - r * cell_size - cell_size / 2
+    #==4.Precompute the center coordinates of every raster column and row, relative to the corner==
+    xs = ((np.arange(cols, dtype=np.float64) + 0.5) * cell_size).astype(np.float32)
+    ys = (-(np.arange(rows, dtype=np.float64) + 0.5) * cell_size).astype(np.float32)
 
-            ##==4.2 Calculate distances from all points to the target cell center==##
-            ## d = sqrt((x2-x1)² + (y2-y1)²) ##
-            distances = np.sqrt((interpo_x - target_x) ** 2 + (interpo_y - target_y) ** 2)
+    #==5.Split the raster into tiles==
+    windows = generate_tiling_grid(rows, cols, tile=tile_size)
 
-            ##==4.3 Avoid division by zero by setting a minimum distance threshold==##
-            distances[distances < 1e-10] = 1e-10
+    #==6.Check the chosen backend==
+    if backend is None:
+        backend = "numpy" if numba is None and idw_kernel_aot is None else "numba"
 
-            ##==4.4 Calculate weights based on distances and power parameter==##
-            weights = 1 / (distances ** power)
+    if k_neighbors is not None and search_radius is not None:
+        raise ValueError("Use either k_neighbors or search_radius, not both.")
+    if (k_neighbors is not None or search_radius is not None) and cKDTree is None:
+        raise ImportError("k_neighbors and search_radius require scipy. Install it with: pip install scipy")
+    if backend == "numba" and numba is None and idw_kernel_aot is None:
+        raise ImportError(
+            "The numba backend requires numba or the precompiled kernel. "
+            "Install numba with: pip install numba"
+            )
 
-            ##==4.5 Calculate the interpolated value for the target cell==##
-            ## z = Σ(w × z) / Σ(w) ##
-            upper_p = np.sum(weights * interpo_z)
-            lower_p = np.sum(weights)
-            interpolated_value = upper_p / lower_p
+    if backend == "cupy" and not gpu_available():
+        print("No CUDA device available for the cupy backend, falling back to the numpy backend.")
+        backend = "numpy"
+
+    if backend == "numba":
+        ###without numba the kernel built by build_idw_kernel.py is used, single core but no compile step###
+        kernel = specialized_idw_kernel(power) if numba is not None else idw_kernel_aot
+
+        ###numba can not use more threads than it started with (NUMBA_NUM_THREADS)###
+        if numba is not None and workers:
+            numba.set_num_threads(min(workers, numba.config.NUMBA_NUM_THREADS))
+
+    shm = None
+    executor = None
+    try:
+        #==7.Set up the tile computation==
+        ##==7.1 k nearest points: one KD-tree shared by all tiles==##
+        if k_neighbors is not None:
+            tree = cKDTree(np.column_stack((interpo_x, interpo_y)), leafsize=40)
+            k = min(k_neighbors, len(interpo_z))
+            tiles = (
+                idw_knn_kernel(tree, interpo_z, xs[c0:c1], ys[r0:r1], power, k, workers=workers or -1)
+                for r0, r1, c0, c1 in windows
+                )
+
+        ##==7.2 Points within a search radius: one KD-tree shared by all tiles==##
+        elif search_radius is not None:
+            tree = cKDTree(np.column_stack((interpo_x, interpo_y)), leafsize=40)
+            tiles = (
+                idw_radius_kernel(
+                    tree, interpo_z, xs[c0:c1], ys[r0:r1], power, search_radius,
+                    workers=workers or -1
+                    )
+                for r0, r1, c0, c1 in windows
+                )
+
+        ##==7.3 Tiles are spread over a process pool, points are shared instead of copied==##
+        elif backend == "multiprocessing":
+            points = np.column_stack((interpo_x, interpo_y, interpo_z))
+            shm = shared_memory.SharedMemory(create=True, size=points.nbytes)
+            np.ndarray(points.shape, dtype=np.float32, buffer=shm.buf)[:] = points
+
+            ###workers are started by a forkserver, forking after numba's thread pool has started can hang###
+            executor = ProcessPoolExecutor(
+                max_workers=workers or os.cpu_count(),
+                mp_context=multiprocessing.get_context("forkserver" if os.name == "posix" else "spawn")
+                )
+            tiles = executor.map(
+                idw_tile_worker,
+                [shm.name] * len(windows),
+                [points.shape] * len(windows),
+                [xs[c0:c1] for r0, r1, c0, c1 in windows],
+                [ys[r0:r1] for r0, r1, c0, c1 in windows],
+                [power] * len(windows)
+                )
 
-            initial_raster_data[r, c] = interpolated_value  
+        ##==7.4 Compiled kernel, every tile is spread over all cores==##
+        elif backend == "numba":
+            tiles = (
+                kernel(interpo_x, interpo_y, interpo_z, xs[c0:c1], ys[r0:r1], np.float32(power))
+                for r0, r1, c0, c1 in windows
+                )
 
-        if (r + 1) % 10 == 0 or r == rows - 1:
-            progress = (r + 1) / rows * 100
-            print(f"Progress: {r + 1}/{rows} Row ({progress:.1f}%)")
-            
-    print("IDW interpolation complete.")
+        ##==7.5 GPU kernel, the points are uploaded once and reused by every tile==##
+        elif backend == "cupy":
+            gpu_x, gpu_y, gpu_z = cupy.asarray(interpo_x), cupy.asarray(interpo_y), cupy.asarray(interpo_z)
+            tiles = (
+                idw_cupy_kernel(gpu_x, gpu_y, gpu_z, xs[c0:c1], ys[r0:r1], power)
+                for r0, r1, c0, c1 in windows
+                )
+
+        ##==7.6 Tiles are processed one after another in this process==##
+        else:
+            tiles = (
+                idw_numpy_kernel(interpo_x, interpo_y, interpo_z, xs[c0:c1], ys[r0:r1], power)
+                for r0, r1, c0, c1 in windows
+                )
+
+        #==8.Collect every tile into the raster array or write it to the output band==
+        last_report = 0.0
+        for i, ((r0, r1, c0, c1), tile) in enumerate(zip(windows, tiles)):
+            if out_band is None:
+                initial_raster_data[r0:r1, c0:c1] = tile
+            else:
+                out_band.WriteArray(tile, xoff=c0, yoff=r0)
+                ###flush once a full strip of tiles is done to keep the block cache small###
+                if c1 == cols:
+                    out_band.FlushCache()
+
+            ##==Progress is redrawn on one line at most twice a second==##
+            now = time.monotonic()
+            if now - last_report >= 0.5 or i == len(windows) - 1:
+                progress = (i + 1) / len(windows) * 100
+                sys.stdout.write(f"\rProgress: {i + 1}/{len(windows)} Tile ({progress:.1f}%)")
+                sys.stdout.flush()
+                last_report = now
+
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+
+    print("\nIDW interpolation complete.")
     return initial_raster_data
 
-def raster_saver(raster_data, extent, spatial_ref, output_path):
+def raster_creator(extent, spatial_ref, output_path, tile_size=512):
     """
-    Function to save raster data to a GeoTIFF file.
+    Function to create an empty georeferenced GeoTIFF file that tiles can be written into.
     
     Parameters:
-    raster_data (numpy.ndarray): gotten from idw_interpolation function.
     extent (dict): Dictionary containing raster extents and cell size. Gotten from raster_region_setup function.
     spatial_ref (osr.SpatialReference): Spatial reference of the raster. Gotten from shp_reader function.
     output_path (str): Path to save the output GeoTIFF file.
+    tile_size (int): Edge length of the interpolation tiles, used as the GeoTIFF block size so every
+                     tile write covers whole blocks. Rounded up to a multiple of 16 as GTiff requires.
+    
+    Returns:
+    out_raster (gdal.Dataset): The created raster dataset. Set it to None to close the file.
+    out_band (gdal.Band): The first raster band of the dataset.
     """
     ##==1. Earn extents and cell size from extent data==##
     x_min = extent['all_x_min']
@@ -229,21 +846,38 @@ def raster_saver(raster_data, extent, spatial_ref, output_path):
     cols = extent['cols']
     rows = extent['rows']
     cell_size = extent['cell_size'] 
+    block_size = -(-tile_size // 16) * 16
 
     ##==2. Set up GeoTIFF driver to create a new raster file==##
     driver = gdal.GetDriverByName("GTiff")
 
-    ##==3. Create a new raster dataset==##
+    ##==3. Set up creation options: blocks matching the interpolation tiles, compression==##
+    ##==with the floating point predictor, and BigTIFF when the file could pass 4 GB==##
+    compression = "ZSTD" if "ZSTD" in (driver.GetMetadataItem("DMD_CREATIONOPTIONLIST") or "") else "LZW"
+    creation_options = [
+        "TILED=YES",
+        f"BLOCKXSIZE={block_size}",
+        f"BLOCKYSIZE={block_size}",
+        f"COMPRESS={compression}",
+        "PREDICTOR=3",
+        "BIGTIFF=IF_SAFER",
+        "NUM_THREADS=ALL_CPUS"
+        ]
+    if compression == "ZSTD":
+        creation_options.append("ZSTD_LEVEL=1")
+
+    ##==4. Create a new raster dataset==##
     ##==Parameters: output path, number of columns, number of rows, number of bands, data type==##
     out_raster = driver.Create(
         output_path,
         cols,
         rows,
         1,
-        gdal.GDT_Float32
+        gdal.GDT_Float32,
+        options=creation_options
         )
     
-    ##==4. Define geotransform and projection parameters for the raster==##
+    ##==5. Define geotransform and projection parameters for the raster==##
     geotransform = (
         x_min,
         cell_size,
@@ -254,19 +888,99 @@ def raster_saver(raster_data, extent, spatial_ref, output_path):
         )
     out_raster.SetGeoTransform(geotransform)
 
-    ##==5. Set spatial reference for the raster==##
+    ##==6. Set spatial reference for the raster==##
     if spatial_ref is not None:
         out_raster.SetProjection(spatial_ref.ExportToWkt())
 
-    ##==6. Write raster data to the raster band==##
+    ##==7. Get the raster band and set its nodata value==##
     out_band = out_raster.GetRasterBand(1)
-    out_band.WriteArray(raster_data)
     out_band.SetNoDataValue(-9999)
 
-    #==7. Close the raster dataset==
+    return out_raster, out_band
+
+def raster_saver(raster_data, extent, spatial_ref, output_path):
+    """
+    Function to save raster data to a GeoTIFF file.
+    
+    Parameters:
+    raster_data (numpy.ndarray): gotten from idw_interpolation function.
+    extent (dict): Dictionary containing raster extents and cell size. Gotten from raster_region_setup function.
+    spatial_ref (osr.SpatialReference): Spatial reference of the raster. Gotten from shp_reader function.
+    output_path (str): Path to save the output GeoTIFF file.
+    """
+    ##==1. Create the georeferenced raster dataset==##
+    out_raster, out_band = raster_creator(extent, spatial_ref, output_path)
+
+    ##==2. Write raster data to the raster band==##
+    out_band.WriteArray(raster_data)
+
+    #==3. Close the raster dataset==
+    out_band = None
     out_raster = None
     print(f"Raster saved successfully at: {output_path}")
 
+def positive_int(text):
+    """
+    Function to check a command line value is a positive integer. Used as an argparse type.
+    
+    Parameters:
+    text (str): Value as given on the command line.
+    
+    Returns:
+    value (int): The parsed value.
+    """
+    try:
+        value = int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid positive integer: '{text}'")
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return value
+
+def tile_size_int(text):
+    """
+    Function to check a tile size is a positive multiple of 16, as GeoTIFF blocks must be. Used as an argparse type.
+    
+    Parameters:
+    text (str): Value as given on the command line.
+    
+    Returns:
+    value (int): The parsed tile size.
+    """
+    value = positive_int(text)
+    if value % 16:
+        raise argparse.ArgumentTypeError(f"must be a multiple of 16, got {value}")
+    return value
+
+def parse_arguments():
+    """
+    Function to read the parallelism options from the command line.
+    Invalid values, including an invalid IDW_WORKERS, stop the tool with a usage message.
+    
+    Returns:
+    args (argparse.Namespace): Parsed options with workers, tile_size and backend.
+    """
+    parser = argparse.ArgumentParser(description="IDW interpolation of a point shapefile into a GeoTIFF raster.")
+    parser.add_argument(
+        "--workers",
+        type=positive_int,
+        default=os.environ.get("IDW_WORKERS") or str(os.cpu_count()),   ##string defaults are checked by type as well
+        help="number of threads or processes to use (default: IDW_WORKERS or all CPUs)"
+        )
+    parser.add_argument(
+        "--tile-size",
+        type=tile_size_int,
+        default=512,
+        help="edge length in cells of the tiles the raster is computed and written in, a multiple of 16 (default: 512)"
+        )
+    parser.add_argument(
+        "--backend",
+        choices=["numpy", "numba", "cupy", "multiprocessing"],
+        default=None,
+        help="interpolation backend (default: numba if installed, otherwise numpy)"
+        )
+    return parser.parse_args()
+
 def main():
     """
     Main function to execute the IDW interpolation workflow.
@@ -277,6 +991,14 @@ def main():
     z_field_name = "depth_aver"  ##name of the field containing Z values in the shapefile
     cell_size = 2      ##cell size for the output raster
     power = 2           ##power parameter for IDW interpolation
+    k_neighbors = None  ##number of nearest points used per cell (None = all points, requires scipy)
+    search_radius = None    ##only use points within this distance of a cell (None = all points, requires scipy)
+
+    ##==Parallelism is set from the command line, see parse_arguments==##
+    args = parse_arguments()
+    backend = args.backend          ##"numba", "numpy", "cupy" or "multiprocessing" (None = numba if installed)
+    tile_size = args.tile_size      ##edge length of the tiles processed in parallel
+    workers = args.workers          ##number of threads or worker processes
 
     ##==2.Check output and input directories==##
     if not defence_check():
@@ -297,13 +1019,28 @@ def main():
     print("\nSetting up raster region...")
     extent = raster_region_setup(all_points, cell_size=cell_size)
 
-    ##==6.Perform IDW interpolation==##
+    ##==6.Create the output GeoTIFF file==##
+    print("\nCreating output GeoTIFF file...")
+    out_raster, out_band = raster_creator(extent, spatial_ref, output_raster_file, tile_size=tile_size)
+
+    ##==7.Perform IDW interpolation, writing every tile straight into the file==##
     print("\nPerforming IDW interpolation...")
-    raster_data = idw_interpolation(all_points, extent, power=power)
+    idw_interpolation(
+        all_points,
+        extent,
+        power=power,
+        k_neighbors=k_neighbors,
+        search_radius=search_radius,
+        backend=backend,
+        tile_size=tile_size,
+        workers=workers,
+        out_band=out_band
+        )
 
-    ##==7.Save interpolated raster to GeoTIFF file==##
-    print("\nSaving interpolated raster to GeoTIFF file...")
-    raster_saver(raster_data, extent, spatial_ref, output_raster_file)
+    ##==8.Close the raster dataset==##
+    out_band = None
+    out_raster = None
+    print(f"Raster saved successfully at: {output_raster_file}")
 
     print("="*50)
     print(" IDW Interpolation Process Completed Successfully ")
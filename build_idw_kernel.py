@@ -0,0 +1,42 @@
+##Ahead-of-time build of the IDW kernel
+#Compiles idw_kernel from IDW_Interpolation.py into a native extension module (idw_kernel_aot)
+#so the interpolation loop can run without numba installed and without JIT warm-up.
+
+
+# region 1. Environment Setup #
+
+import os                           ## for file path manipulations
+
+from numba.pycc import CC           ## for ahead-of-time compilation
+
+from IDW_Interpolation import idw_kernel
+
+# endregion #
+
+# region 2. Build #
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def build():
+    """
+    Function to compile the IDW kernel into a native extension next to this script.
+    AOT compilation does not support parallel=True, so the compiled loop runs on a single core.
+    """
+    #==1.Set up the extension module==
+    cc = CC("idw_kernel_aot")
+    cc.output_dir = BASE_DIR
+    cc.target_cpu = "host"      ###tune for the CPU of the build machine, like -march=native###
+    cc.verbose = True
+
+    #==2.Register the kernel with an explicit float32 signature==
+    ##==Parameters: interpo_x, interpo_y, interpo_z, xs, ys, power==##
+    cc.export("idw_kernel", "f4[:,:](f4[:], f4[:], f4[:], f4[:], f4[:], f4)")(idw_kernel)
+
+    #==3.Compile==
+    cc.compile()
+    print(f"IDW kernel compiled into {BASE_DIR}.")
+
+# endregion #
+
+if __name__ == "__main__":
+    build()